@@ -0,0 +1,140 @@
+//! Extensión nativa de `scripts/arraigo_etl.py`: texto de PDF (lopdf) + keywords (RegexSet).
+//!
+//! Las keywords no viven aquí: Python pasa sus listas al construir `Classifier`, compilado
+//! una sola vez al importar el script. `extract_and_classify` suelta el GIL, así que los
+//! hilos de descarga de `etl_borme` parsean PDFs en paralelo de verdad.
+
+use lopdf::Document;
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+use regex::{RegexSet, RegexSetBuilder};
+use std::panic::{self, AssertUnwindSafe};
+
+#[pyclass(frozen)]
+struct Classifier {
+    set: RegexSet,
+    class_of: Vec<usize>,
+    n_classes: usize,
+    excerpt_len: usize,
+    max_pages: usize,
+    seam_len: usize,
+}
+
+#[pymethods]
+impl Classifier {
+    #[new]
+    #[pyo3(signature = (classes, excerpt_len = 1200, max_pages = 500, seam_len = 64))]
+    fn new(classes: Vec<Vec<String>>, excerpt_len: usize, max_pages: usize, seam_len: usize) -> PyResult<Self> {
+        let mut patterns = Vec::new();
+        let mut class_of = Vec::new();
+        for (i, class) in classes.iter().enumerate() {
+            for p in class {
+                patterns.push(p.as_str());
+                class_of.push(i);
+            }
+        }
+        let set = RegexSetBuilder::new(&patterns)
+            .case_insensitive(true)
+            .build()
+            .map_err(|e| PyValueError::new_err(e.to_string()))?;
+        Ok(Classifier { set, class_of, n_classes: classes.len(), excerpt_len, max_pages, seam_len })
+    }
+
+    /// Devuelve (extracto, aciertos por clase, páginas leídas).
+    ///
+    /// `data` es cualquier buffer de bytes contiguo (bytes, memoryview, mmap): Python pasa un
+    /// mmap del fichero temporal para los PDFs grandes, sin copiarlos a memoria.
+    fn extract_and_classify(&self, py: Python<'_>, data: PyBuffer<u8>) -> PyResult<(String, Vec<bool>, usize)> {
+        if !data.is_c_contiguous() {
+            return Err(PyValueError::new_err("buffer no contiguo"));
+        }
+        // SAFETY: `data` mantiene exportado el buffer (y vivo el objeto Python) hasta el final
+        // de esta función; los buffers que pasa arraigo_etl son de solo lectura.
+        let data: &[u8] = unsafe { std::slice::from_raw_parts(data.buf_ptr() as *const u8, data.len_bytes()) };
+        // lopdf puede hacer panic con PDFs malformados; pyo3 lo convertiría en PanicException
+        // (BaseException), que tumbaría todo etl_borme. Como ValueError, Python usa su fallback.
+        py.allow_threads(|| {
+            panic::catch_unwind(AssertUnwindSafe(|| self.run(data)))
+                .unwrap_or_else(|p| Err(format!("panic en lopdf: {}", panic_message(&*p))))
+        })
+        .map_err(PyValueError::new_err)
+    }
+}
+
+impl Classifier {
+    // Mismo recorrido que scan_pdf en Python: página a página, costura entre páginas,
+    // y parada en cuanto están todas las clases y el extracto completo.
+    fn run(&self, data: &[u8]) -> Result<(String, Vec<bool>, usize), String> {
+        let doc = Document::load_mem(data).map_err(|e| e.to_string())?;
+        let mut hits = vec![false; self.n_classes];
+        let mut excerpt = String::new();
+        let mut excerpt_chars = 0;
+        let mut tail = String::new();
+        let mut read = 0;
+        let mut any_text = false;
+
+        for &page_no in doc.get_pages().keys() {
+            if read >= self.max_pages {
+                break;
+            }
+            // Un fallo de página es error, no texto vacío: Python reintenta con PDFium/PyPDF2
+            let text = doc
+                .extract_text(&[page_no])
+                .map_err(|e| format!("página {}: {}", page_no, e))?;
+            read += 1;
+            any_text |= !text.trim().is_empty();
+
+            if excerpt_chars < self.excerpt_len {
+                if read > 1 {
+                    excerpt.push('\n');
+                    excerpt_chars += 1;
+                }
+                for ch in text.chars().take(self.excerpt_len - excerpt_chars) {
+                    excerpt.push(ch);
+                    excerpt_chars += 1;
+                }
+            }
+
+            self.mark(&text, &mut hits);
+            if !tail.is_empty() {
+                let head: String = text.chars().take(self.seam_len).collect();
+                self.mark(&format!("{}\n{}", tail, head), &mut hits);
+            }
+            let n = text.chars().count();
+            tail = text.chars().skip(n.saturating_sub(self.seam_len)).collect();
+
+            if hits.iter().all(|&h| h) && excerpt_chars >= self.excerpt_len {
+                break;
+            }
+        }
+        // Sin texto en ninguna página (fuentes CID/Identity-H sin ToUnicode, p. ej.), el
+        // resultado sería "sin señales" y el item se descartaría en silencio
+        if !any_text {
+            return Err(format!("sin texto extraíble en {} páginas", read));
+        }
+        Ok((excerpt, hits, read))
+    }
+
+    fn mark(&self, text: &str, hits: &mut [bool]) {
+        for i in self.set.matches(text).iter() {
+            hits[self.class_of[i]] = true;
+        }
+    }
+}
+
+fn panic_message(p: &(dyn std::any::Any + Send)) -> String {
+    if let Some(s) = p.downcast_ref::<&str>() {
+        s.to_string()
+    } else if let Some(s) = p.downcast_ref::<String>() {
+        s.clone()
+    } else {
+        "sin mensaje".to_string()
+    }
+}
+
+#[pymodule]
+fn arraigo_pdf(_py: Python<'_>, m: &PyModule) -> PyResult<()> {
+    m.add_class::<Classifier>()?;
+    Ok(())
+}
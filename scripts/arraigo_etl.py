@@ -3,12 +3,21 @@
 
 import os
 import re
+import json
+import mmap
 import argparse
 import hashlib
-from datetime import datetime, timezone
-from typing import Dict, List
+import shutil
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PyPDF2 import PdfReader
 import pyodbc
 
@@ -17,11 +26,47 @@ try:
 except Exception:
     BeautifulSoup = None
 
+try:
+    import lxml  # noqa: F401  (parser C para BeautifulSoup)
+    HTML_PARSER = "lxml"
+except Exception:
+    HTML_PARSER = "html.parser"
+
+try:
+    import re2  # google-re2: DFA en tiempo lineal para el filtro de enlaces
+except Exception:
+    re2 = None
+
+try:
+    import pypdfium2 as pdfium
+except Exception:
+    pdfium = None
+
+try:
+    import hyperscan
+except Exception:
+    hyperscan = None
+
+try:
+    import arraigo_pdf  # extensión Rust opcional (native/arraigo_pdf), PDF + keywords sin GIL
+except Exception:
+    arraigo_pdf = None
+
 # -----------------------------
 # Config
 # -----------------------------
 
 BORME_API = "https://boe.es/datosabiertos/api/borme/sumario/{yyyymmdd}"  # API oficial 
+BORME_WORKERS = 8  # descargas + parseo de PDFs en paralelo
+BORME_CACHE_DIR = os.environ.get("BORME_CACHE_DIR", ".cache/borme")  # vacío = sin caché
+BORME_CACHE_MAX_AGE_DAYS = 30
+BORME_DEDUP_DAYS = 7  # ventana de source_ref ya cargados que se saltan sin ir a SQL por item
+
+# Hash de company_key: "blake2b" (por defecto) o "md5" (el de versiones anteriores).
+# Al cambiarlo, las claves ya cargadas se recalculan una sola vez (migrate_company_keys).
+COMPANY_KEY_HASH = (os.environ.get("COMPANY_KEY_HASH") or "blake2b").strip().lower()
+if COMPANY_KEY_HASH not in ("blake2b", "md5"):
+    raise ValueError(f"COMPANY_KEY_HASH no soportado: {COMPANY_KEY_HASH} (blake2b|md5)")
 
 KEYWORDS_POS = [
     r"\bcesi[oó]n\b",
@@ -46,6 +91,43 @@ KEYWORDS_NEG = [
     r"\binsolvenc",
 ]
 
+SIGNAL_CLASSES = [
+    ("pos", KEYWORDS_POS),
+    ("gov", KEYWORDS_GOV),
+    ("neg", KEYWORDS_NEG),
+]
+
+def _keyword_expr(p: str) -> str:
+    # Los espacios admiten saltos de línea del PDF
+    return p.replace(" ", r"\s+")
+
+def _compile_keywords(patterns: List[str]) -> re.Pattern:
+    # Una sola alternancia por clase
+    alt = "|".join(f"(?:{_keyword_expr(p)})" for p in patterns)
+    return re.compile(alt, re.IGNORECASE)
+
+def _compile_hyperscan():
+    # Una sola base de datos con las tres clases; id = índice de la clase
+    exprs, ids = [], []
+    for i, (_, patterns) in enumerate(SIGNAL_CLASSES):
+        for p in patterns:
+            exprs.append(_keyword_expr(p).encode("utf-8"))
+            ids.append(i)
+    # Sin HS_FLAG_UCP: hyperscan no admite \b en modo UCP
+    flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_SINGLEMATCH
+    db = hyperscan.Database()
+    db.compile(expressions=exprs, ids=ids, elements=len(exprs), flags=[flags] * len(exprs))
+    return db
+
+_SIGNAL_RES = {name: _compile_keywords(patterns) for name, patterns in SIGNAL_CLASSES}
+
+_HS_DB = None
+if hyperscan is not None:
+    try:
+        _HS_DB = _compile_hyperscan()
+    except Exception as e:
+        print(f"[WARN] hyperscan no disponible, se usa re -> {e}")
+
 # ⚠️ URLs base (hasta que tengas links exactos de listados)
 # Si luego me das las URLs de listados reales, lo hacemos más preciso.
 REGIONAL_SOURCES = [
@@ -54,39 +136,123 @@ REGIONAL_SOURCES = [
     {"source": "RelevoCantabria", "ccaa": "Cantabria",       "list_url": "https://relevocantabria.com/oferta-de-empresas/"},
 ]
 
+# Texto de enlace que delata un listing (una sola pasada por anchor).
+# (?i) en línea en vez de flags: la API de google-re2 no acepta re.IGNORECASE.
+_LINK_RE = (re2 or re).compile(r"(?i)oferta|oportunidad|negocio|traspaso|relevo|comprar|vender")
+
 # -----------------------------
 # Helpers
 # -----------------------------
 
+def _http_session() -> requests.Session:
+    # Una sola sesión: keep-alive y pool compartido entre hilos (boe.es y fuentes regionales)
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
+    ))
+    s.headers.update({"Accept-Encoding": "gzip"})
+    return s
+
+_SESSION = _http_session()
+
 def utc_today_yyyymmdd() -> str:
     return datetime.now(timezone.utc).strftime("%Y%m%d")
 
+_WS_RE = re.compile(r"\s+")
+
 def norm_text(s: str) -> str:
     s = (s or "").strip().lower()
-    s = re.sub(r"\s+", " ", s)
+    s = _WS_RE.sub(" ", s)
     return s
 
 def make_company_key(name: str, province: str, ccaa: str) -> str:
     base = f"{norm_text(name)}|{norm_text(province)}|{norm_text(ccaa)}"
+    if COMPANY_KEY_HASH == "blake2b":
+        # 16 bytes -> 32 hex, igual que MD5: cabe en VARCHAR(32)
+        return hashlib.blake2b(base.encode("utf-8"), digest_size=16).hexdigest()
     return hashlib.md5(base.encode("utf-8")).hexdigest()
 
+def _detect_signals_hs(t: str) -> Dict[str, bool]:
+    hits = [False] * len(SIGNAL_CLASSES)
+
+    def on_match(id, start, end, flags, context):
+        hits[id] = True
+        return all(hits)  # True = detener el escaneo
+
+    try:
+        # "replace": PyPDF2 puede dejar surrogates sueltos (ToUnicode con surrogatepass)
+        _HS_DB.scan(t.encode("utf-8", "replace"), match_event_handler=on_match)
+    except hyperscan.error:
+        if not all(hits):
+            raise
+    return {name: hit for (name, _), hit in zip(SIGNAL_CLASSES, hits)}
+
 def detect_signals(text: str) -> Dict[str, bool]:
-    t = norm_text(text)
-    pos = any(re.search(p, t) for p in KEYWORDS_POS)
-    gov = any(re.search(p, t) for p in KEYWORDS_GOV)
-    neg = any(re.search(p, t) for p in KEYWORDS_NEG)
-    return {"pos": pos, "gov": gov, "neg": neg}
-
-def pdf_text_from_url(url: str) -> str:
-    r = requests.get(url, timeout=90)
-    r.raise_for_status()
-    from io import BytesIO
-    bio = BytesIO(r.content)
-    reader = PdfReader(bio)
-    parts = []
-    for page in reader.pages:
-        parts.append(page.extract_text() or "")
-    return "\n".join(parts)
+    t = text or ""
+    if _HS_DB is not None:
+        return _detect_signals_hs(t)
+    return {name: bool(rx.search(t)) for name, rx in _SIGNAL_RES.items()}
+
+PDF_SPOOL_MAX = 8 << 20  # por encima, el PDF se vuelca a disco
+PDF_MAX_PAGES = 500      # tope de páginas leídas por PDF (entradas patológicas)
+EXCERPT_LEN = 1200       # longitud de raw_excerpt
+_SEAM_LEN = 64           # caracteres a cada lado del salto de página que se re-escanean
+
+# Motor de extracción: PDFium primero. arraigo_pdf (lopdf) aún no se ha contrastado con
+# _scan_pages sobre sumarios reales y puede devolver texto basura con fuentes CID sin error,
+# así que solo se usa si no hay pypdfium2 o con BORME_PDF_ENGINE=native (para compararlo).
+BORME_PDF_ENGINE = (os.environ.get("BORME_PDF_ENGINE") or "auto").strip().lower()
+if BORME_PDF_ENGINE not in ("auto", "native", "python"):
+    raise ValueError(f"BORME_PDF_ENGINE no soportado: {BORME_PDF_ENGINE} (auto|native|python)")
+
+_NATIVE = None
+if arraigo_pdf is not None and (BORME_PDF_ENGINE == "native" or (BORME_PDF_ENGINE == "auto" and pdfium is None)):
+    try:
+        _NATIVE = arraigo_pdf.Classifier(
+            [[_keyword_expr(p) for p in patterns] for _, patterns in SIGNAL_CLASSES],
+            EXCERPT_LEN, PDF_MAX_PAGES, _SEAM_LEN,
+        )
+    except Exception as e:
+        print(f"[WARN] arraigo_pdf no disponible, se usa Python -> {e}")
+
+# PDFium no es thread-safe: sus llamadas se serializan entre hilos
+_PDFIUM_LOCK = threading.Lock()
+
+def _pdf_page_texts(buf) -> Iterator[str]:
+    # pypdfium2 (PDFium, C++) si está disponible; si no, PyPDF2
+    if pdfium is None:
+        for page in PdfReader(buf).pages:
+            yield page.extract_text() or ""
+        return
+
+    # El lock cubre solo las llamadas a PDFium: el texto de cada página se copia a un str
+    # y se suelta antes del yield, así detect_signals no queda serializado entre hilos
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(buf)
+        n_pages = len(pdf)
+    try:
+        for i in range(n_pages):
+            with _PDFIUM_LOCK:
+                page = pdf[i]
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_range() or ""
+                finally:
+                    textpage.close()
+                    page.close()
+            yield text
+    finally:
+        with _PDFIUM_LOCK:
+            pdf.close()
+
+def download_pdf(url: str, buf):
+    # Descarga en streaming: sin copia completa en r.content
+    with _SESSION.get(url, timeout=90, stream=True, headers={"Accept-Encoding": "identity"}) as r:
+        r.raise_for_status()
+        shutil.copyfileobj(r.raw, buf, length=1 << 16)
+    buf.seek(0)
 
 # -----------------------------
 # Azure SQL
@@ -107,10 +273,34 @@ def sql_conn():
         "Encrypt=yes;"
         "TrustServerCertificate=no;"
         "Connection Timeout=30;"
+        # Paquetes TDS grandes para los lotes de fast_executemany (máximo de SQL Server: 32767)
+        "Packet Size=32767;"
+        "MARS_Connection=no;"
     )
-    return pyodbc.connect(conn_str)
+    # Transacción explícita: un único commit al final de cada ETL
+    return pyodbc.connect(conn_str, autocommit=False)
+
+# Esquemas ya verificados en este proceso
+_SCHEMA_READY: Set[str] = set()
 
 def ensure_schema(cur, schema: str):
+    # Camino habitual: una sola consulta confirma que el último objeto del DDL ya existe
+    if schema in _SCHEMA_READY:
+        return
+    cur.execute("""
+SELECT CASE
+  WHEN OBJECT_ID(?, 'U') IS NOT NULL
+   AND EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_signals_inserted_at' AND object_id = OBJECT_ID(?))
+   AND OBJECT_ID(?, 'U') IS NOT NULL
+  THEN 1 ELSE 0
+END;
+""", (f"{schema}.scores", f"{schema}.signals", f"{schema}.etl_meta"))
+    if cur.fetchone()[0] == 1:
+        _SCHEMA_READY.add(schema)
+        return
+
+    # Primera ejecución: el esquema aparte (debe existir antes de crear tablas en él)
+    # y todo el DDL de tablas e índices en un único batch
     cur.execute(f"""
 IF NOT EXISTS (SELECT * FROM sys.schemas WHERE name = '{schema}')
 BEGIN
@@ -119,6 +309,8 @@ END
 """)
 
     cur.execute(f"""
+SET NOCOUNT ON;
+
 IF OBJECT_ID('{schema}.companies', 'U') IS NULL
 BEGIN
   CREATE TABLE {schema}.companies (
@@ -130,9 +322,7 @@ BEGIN
     created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
   );
 END
-""")
 
-    cur.execute(f"""
 IF OBJECT_ID('{schema}.events', 'U') IS NULL
 BEGIN
   CREATE TABLE {schema}.events (
@@ -150,9 +340,7 @@ BEGIN
   CREATE INDEX IX_events_company_key ON {schema}.events(company_key);
   CREATE INDEX IX_events_date ON {schema}.events(event_date);
 END
-""")
 
-    cur.execute(f"""
 IF OBJECT_ID('{schema}.signals', 'U') IS NULL
 BEGIN
   CREATE TABLE {schema}.signals (
@@ -169,9 +357,7 @@ BEGIN
   CREATE INDEX IX_signals_company_key ON {schema}.signals(company_key);
   CREATE INDEX IX_signals_date ON {schema}.signals(signal_date);
 END
-""")
 
-    cur.execute(f"""
 IF OBJECT_ID('{schema}.scores', 'U') IS NULL
 BEGIN
   CREATE TABLE {schema}.scores (
@@ -182,88 +368,341 @@ BEGIN
     updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
   );
 END
+
+-- Filtro del recálculo incremental de scores (también en tablas ya existentes)
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_signals_inserted_at' AND object_id = OBJECT_ID('{schema}.signals'))
+BEGIN
+  CREATE INDEX IX_signals_inserted_at ON {schema}.signals(inserted_at) INCLUDE (company_key);
+END
+
+-- Estado del ETL entre ejecuciones (p. ej. el hash con el que están las company_key)
+IF OBJECT_ID('{schema}.etl_meta', 'U') IS NULL
+BEGIN
+  CREATE TABLE {schema}.etl_meta (
+    name NVARCHAR(64) PRIMARY KEY,
+    value NVARCHAR(256) NOT NULL,
+    updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+  );
+END
+""")
+    _SCHEMA_READY.add(schema)
+
+# Tipos de parámetro de las tablas #stage_*: con fast_executemany, pyodbc no siempre
+# detecta las columnas de una tabla temporal local (SQLDescribeParam), así que se declaran.
+# (tipo SQL, tamaño, decimales); tamaño 0 en SQL_WVARCHAR = NVARCHAR(MAX)
+_STAGE_COMPANIES_SIZES = [
+    (pyodbc.SQL_VARCHAR, 32, 0),     # company_key
+    (pyodbc.SQL_WVARCHAR, 512, 0),   # name
+    (pyodbc.SQL_WVARCHAR, 128, 0),   # province
+    (pyodbc.SQL_WVARCHAR, 128, 0),   # ccaa
+]
+_STAGE_EVENTS_SIZES = [
+    (pyodbc.SQL_INTEGER, 0, 0),      # row_no
+    (pyodbc.SQL_WVARCHAR, 64, 0),    # source
+    (pyodbc.SQL_WVARCHAR, 256, 0),   # source_ref
+    (pyodbc.SQL_TYPE_DATE, 0, 0),    # event_date
+    (pyodbc.SQL_WVARCHAR, 64, 0),    # event_type
+    (pyodbc.SQL_WVARCHAR, 512, 0),   # title
+    (pyodbc.SQL_WVARCHAR, 1024, 0),  # url
+    (pyodbc.SQL_WVARCHAR, 0, 0),     # raw_excerpt
+    (pyodbc.SQL_VARCHAR, 32, 0),     # company_key
+]
+_STAGE_SIGNALS_SIZES = [
+    (pyodbc.SQL_VARCHAR, 32, 0),     # company_key
+    (pyodbc.SQL_TYPE_DATE, 0, 0),    # signal_date
+    (pyodbc.SQL_WVARCHAR, 64, 0),    # signal_kind
+    (pyodbc.SQL_INTEGER, 0, 0),      # weight
+    (pyodbc.SQL_WVARCHAR, 64, 0),    # source
+    (pyodbc.SQL_INTEGER, 0, 0),      # event_row
+    (pyodbc.SQL_WVARCHAR, 1024, 0),  # notes
+]
+_STAGE_REKEY_SIZES = [
+    (pyodbc.SQL_VARCHAR, 32, 0),     # old_key
+    (pyodbc.SQL_VARCHAR, 32, 0),     # new_key
+]
+
+def _nvarchar_len(s: str) -> int:
+    # NVARCHAR(n) cuenta unidades UTF-16: fuera del BMP (emoji, p. ej.) cada carácter ocupa 2
+    return len(s.encode("utf-16-le", "surrogatepass")) // 2
+
+def fit_nvarchar(s: str, size: int) -> str:
+    # Recorta a `size` unidades UTF-16 (el tamaño de la columna), no a `size` caracteres
+    s = s[:size]
+    while _nvarchar_len(s) > size:
+        s = s[:-1]
+    return s
+
+def clean_nvarchar(s: str) -> str:
+    # Surrogates sueltos (PyPDF2 con surrogatepass) no se codifican a UTF-16 y harían fallar el lote
+    return s.encode("utf-8", "replace").decode("utf-8")
+
+def check_nvarchar(s: Optional[str], size: int, field: str) -> Optional[str]:
+    # Para valores que no se pueden recortar sin romperlos (URLs): se descarta el item
+    if s is not None and _nvarchar_len(s) > size:
+        raise ValueError(f"{field} excede NVARCHAR({size}): {_nvarchar_len(s)} caracteres")
+    return s
+
+def _stage_rows(cur, sql: str, rows: List[Tuple], sizes: List[Tuple[int, int, int]]):
+    # Un solo lote: si una fila falla (p. ej. truncado), falla la ejecución entera y no se
+    # hace commit. Por eso cada campo se ajusta a su columna al construir la fila, dentro del
+    # try de cada item (fit_nvarchar / clean_nvarchar / check_nvarchar): un item malo se descarta solo.
+    cur.setinputsizes(sizes)
+    try:
+        cur.executemany(sql, rows)
+    finally:
+        cur.setinputsizes(None)  # no arrastrar los tipos a las consultas siguientes
+
+def upsert_companies(cur, schema: str, rows: List[Tuple[str, str, str, str]]):
+    # rows = (company_key, name, province, ccaa); una fila por clave en el staging
+    rows = list({r[0]: r for r in rows}.values())
+    if not rows:
+        return
+
+    # Sin parámetros: la tabla temporal sobrevive al batch (sp_prepexec la descartaría)
+    cur.execute("""
+SET NOCOUNT ON;
+DROP TABLE IF EXISTS #stage_companies;
+CREATE TABLE #stage_companies (
+  company_key VARCHAR(32) NOT NULL PRIMARY KEY,
+  name NVARCHAR(512) NOT NULL,
+  province NVARCHAR(128) NULL,
+  ccaa NVARCHAR(128) NULL
+);
+""")
+    _stage_rows(cur, """
+INSERT INTO #stage_companies (company_key, name, province, ccaa) VALUES (?, ?, ?, ?);
+""", rows, _STAGE_COMPANIES_SIZES)
+    # Casi siempre la empresa ya existe con los mismos datos: en vez de MERGE (que reescribe
+    # todas las coincidencias) se actualiza solo lo que difiere y se inserta lo nuevo.
+    # EXISTS (... EXCEPT ...) compara tratando NULL = NULL.
+    cur.execute(f"""
+SET NOCOUNT ON;
+UPDATE c
+SET name = s.name, province = s.province, ccaa = s.ccaa
+FROM {schema}.companies AS c
+JOIN #stage_companies AS s ON s.company_key = c.company_key
+WHERE EXISTS (SELECT s.name, s.province, s.ccaa EXCEPT SELECT c.name, c.province, c.ccaa);
+
+INSERT INTO {schema}.companies (company_key, name, province, ccaa)
+SELECT s.company_key, s.name, s.province, s.ccaa
+FROM #stage_companies AS s
+WHERE NOT EXISTS (SELECT 1 FROM {schema}.companies AS c WHERE c.company_key = s.company_key);
+
+DROP TABLE #stage_companies;
 """)
 
-def upsert_company(cur, schema: str, ckey: str, name: str, province: str, ccaa: str):
+def insert_events(cur, schema: str, events: List[Dict], signals: List[Dict]):
+    # Cada señal apunta a su evento por posición (sig["event_idx"]); el event_id real
+    # se resuelve en servidor con MERGE ... OUTPUT, sin un round trip por fila
+    if not events and not signals:
+        return
+
+    cur.execute("""
+SET NOCOUNT ON;
+DROP TABLE IF EXISTS #stage_events;
+DROP TABLE IF EXISTS #stage_signals;
+DROP TABLE IF EXISTS #event_ids;
+CREATE TABLE #stage_events (
+  row_no INT NOT NULL PRIMARY KEY,
+  source NVARCHAR(64) NOT NULL,
+  source_ref NVARCHAR(256) NULL,
+  event_date DATE NULL,
+  event_type NVARCHAR(64) NOT NULL,
+  title NVARCHAR(512) NULL,
+  url NVARCHAR(1024) NULL,
+  raw_excerpt NVARCHAR(MAX) NULL,
+  company_key VARCHAR(32) NULL
+);
+CREATE TABLE #stage_signals (
+  company_key VARCHAR(32) NOT NULL,
+  signal_date DATE NOT NULL,
+  signal_kind NVARCHAR(64) NOT NULL,
+  weight INT NOT NULL,
+  source NVARCHAR(64) NOT NULL,
+  event_row INT NULL,
+  notes NVARCHAR(1024) NULL
+);
+CREATE TABLE #event_ids (
+  row_no INT NOT NULL PRIMARY KEY,
+  event_id BIGINT NOT NULL
+);
+""")
+    if events:
+        _stage_rows(cur, """
+INSERT INTO #stage_events (row_no, source, source_ref, event_date, event_type, title, url, raw_excerpt, company_key)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+""", [(
+            i,
+            ev.get("source"),
+            ev.get("source_ref"),
+            ev.get("event_date"),
+            ev.get("event_type"),
+            ev.get("title"),
+            ev.get("url"),
+            ev.get("raw_excerpt"),
+            ev.get("company_key"),
+        ) for i, ev in enumerate(events)], _STAGE_EVENTS_SIZES)
+    if signals:
+        _stage_rows(cur, """
+INSERT INTO #stage_signals (company_key, signal_date, signal_kind, weight, source, event_row, notes)
+VALUES (?, ?, ?, ?, ?, ?, ?);
+""", [(
+            sig["company_key"],
+            sig["signal_date"],
+            sig["signal_kind"],
+            sig["weight"],
+            sig["source"],
+            sig.get("event_idx"),
+            sig.get("notes"),
+        ) for sig in signals], _STAGE_SIGNALS_SIZES)
+
+    # MERGE ON 1 = 0 inserta todo y, a diferencia de INSERT, deja usar src.row_no en OUTPUT
     cur.execute(f"""
-MERGE {schema}.companies AS tgt
-USING (SELECT ? AS company_key, ? AS name, ? AS province, ? AS ccaa) AS src
-ON tgt.company_key = src.company_key
-WHEN MATCHED THEN
-  UPDATE SET name = src.name, province = src.province, ccaa = src.ccaa
+SET NOCOUNT ON;
+MERGE {schema}.events AS tgt
+USING #stage_events AS src
+ON 1 = 0
 WHEN NOT MATCHED THEN
-  INSERT (company_key, name, province, ccaa) VALUES (src.company_key, src.name, src.province, src.ccaa);
-""", (ckey, name, province, ccaa))
+  INSERT (source, source_ref, event_date, event_type, title, url, raw_excerpt, company_key)
+  VALUES (src.source, src.source_ref, src.event_date, src.event_type, src.title, src.url, src.raw_excerpt, src.company_key)
+OUTPUT src.row_no, INSERTED.event_id INTO #event_ids (row_no, event_id);
+
+INSERT INTO {schema}.signals (company_key, signal_date, signal_kind, weight, source, event_id, notes)
+SELECT s.company_key, s.signal_date, s.signal_kind, s.weight, s.source, e.event_id, s.notes
+FROM #stage_signals AS s
+LEFT JOIN #event_ids AS e ON e.row_no = s.event_row;
+
+DROP TABLE #stage_events;
+DROP TABLE #stage_signals;
+DROP TABLE #event_ids;
+""")
 
-def insert_event(cur, schema: str, ev: Dict) -> int:
+def recent_source_refs(cur, schema: str, source: str, since: date) -> Set[str]:
+    # Una sola consulta por ejecución; el filtrado se hace en memoria
     cur.execute(f"""
-INSERT INTO {schema}.events (source, source_ref, event_date, event_type, title, url, raw_excerpt, company_key)
-OUTPUT INSERTED.event_id
-VALUES (?, ?, ?, ?, ?, ?, ?, ?);
-""", (
-        ev.get("source"),
-        ev.get("source_ref"),
-        ev.get("event_date"),
-        ev.get("event_type"),
-        ev.get("title"),
-        ev.get("url"),
-        ev.get("raw_excerpt"),
-        ev.get("company_key"),
-    ))
+SELECT DISTINCT source_ref
+FROM {schema}.events
+WHERE source = ? AND event_date >= ? AND source_ref IS NOT NULL;
+""", (source, since))
+    return {row[0] for row in cur.fetchall()}
+
+def sql_now(cur) -> datetime:
+    # Hora del servidor: marca de agua para el recálculo incremental (sin desfase de reloj)
+    cur.execute("SELECT SYSUTCDATETIME();")
     return cur.fetchone()[0]
 
-def insert_signal(cur, schema: str, sig: Dict):
-    cur.execute(f"""
-INSERT INTO {schema}.signals (company_key, signal_date, signal_kind, weight, source, event_id, notes)
-VALUES (?, ?, ?, ?, ?, ?, ?);
-""", (
-        sig["company_key"],
-        sig["signal_date"],
-        sig["signal_kind"],
-        sig["weight"],
-        sig["source"],
-        sig.get("event_id"),
-        sig.get("notes"),
-    ))
+def recompute_scores(cur, schema: str, version: str = "v0_rules_2026_02", since: Optional[datetime] = None):
+    # since = None recalcula todo; si no, solo las empresas con señales insertadas desde `since`
+    where, params = "", []
+    if since is not None:
+        where = f"WHERE company_key IN (SELECT company_key FROM {schema}.signals WHERE inserted_at >= ?)"
+        params.append(since)
 
-def recompute_scores(cur, schema: str, version: str = "v0_rules_2026_02"):
+    # El recorte a [0, 100] no cambia la banda: se calcula sobre SUM(weight) en el mismo paso.
+    # Solo se reescriben filas cuyo score, banda o versión cambian (menos log de transacciones).
     cur.execute(f"""
-WITH agg AS (
-  SELECT company_key, SUM(weight) AS raw_score
-  FROM {schema}.signals
-  GROUP BY company_key
-),
-norm AS (
+WITH src AS (
   SELECT
     company_key,
     CASE
-      WHEN raw_score < 0 THEN 0
-      WHEN raw_score > 100 THEN 100
-      ELSE raw_score
-    END AS score
-  FROM agg
-),
-banded AS (
-  SELECT
-    company_key,
-    score,
+      WHEN SUM(weight) < 0 THEN 0
+      WHEN SUM(weight) > 100 THEN 100
+      ELSE SUM(weight)
+    END AS score,
     CASE
-      WHEN score >= 75 THEN 'Hot'
-      WHEN score >= 60 THEN 'Warm'
-      WHEN score >= 45 THEN 'Watchlist'
+      WHEN SUM(weight) >= 75 THEN 'Hot'
+      WHEN SUM(weight) >= 60 THEN 'Warm'
+      WHEN SUM(weight) >= 45 THEN 'Watchlist'
       ELSE 'Cold'
     END AS band
-  FROM norm
+  FROM {schema}.signals
+  {where}
+  GROUP BY company_key
 )
 MERGE {schema}.scores AS tgt
-USING (SELECT company_key, score, band FROM banded) AS src
+USING src
 ON tgt.company_key = src.company_key
-WHEN MATCHED THEN
+WHEN MATCHED AND (tgt.score <> src.score OR tgt.band <> src.band OR tgt.score_version <> ?) THEN
   UPDATE SET score = src.score, band = src.band, score_version = ?, updated_at = SYSUTCDATETIME()
 WHEN NOT MATCHED THEN
   INSERT (company_key, score, band, score_version, updated_at)
   VALUES (src.company_key, src.score, src.band, ?, SYSUTCDATETIME());
-""", (version, version))
+""", (*params, version, version, version))
+
+def migrate_company_keys(cur, schema: str) -> bool:
+    # Backfill único al cambiar COMPANY_KEY_HASH: recalcula cada company_key desde
+    # companies.name/province/ccaa y la propaga a events, signals y scores.
+    # Devuelve True si ha escrito algo (el llamador hace commit antes de seguir).
+    cur.execute(f"SELECT value FROM {schema}.etl_meta WHERE name = 'company_key_hash';")
+    row = cur.fetchone()
+    if row and row[0] == COMPANY_KEY_HASH:
+        return False
+
+    # Con el lock, otra ejecución (BORME / regional) espera a que acabe la migración y la ve hecha
+    cur.execute(f"SELECT value FROM {schema}.etl_meta WITH (UPDLOCK, HOLDLOCK) WHERE name = 'company_key_hash';")
+    row = cur.fetchone()
+    if row and row[0] == COMPANY_KEY_HASH:
+        return False
+
+    cur.execute(f"SELECT company_key, name, province, ccaa FROM {schema}.companies;")
+    pairs = []
+    for old_key, name, province, ccaa in cur.fetchall():
+        new_key = make_company_key(name, province or "", ccaa or "")
+        if new_key != old_key:
+            pairs.append((old_key, new_key))
+
+    if pairs:
+        cur.execute("""
+SET NOCOUNT ON;
+DROP TABLE IF EXISTS #rekey;
+CREATE TABLE #rekey (
+  old_key VARCHAR(32) NOT NULL PRIMARY KEY,
+  new_key VARCHAR(32) NOT NULL
+);
+""")
+        _stage_rows(cur, """
+INSERT INTO #rekey (old_key, new_key) VALUES (?, ?);
+""", pairs, _STAGE_REKEY_SIZES)
+        # Si la clave nueva ya existe (ejecuciones previas con el otro hash), la empresa
+        # antigua se funde en ella; los scores se recalculan enteros al final
+        cur.execute(f"""
+SET NOCOUNT ON;
+UPDATE e SET company_key = r.new_key
+FROM {schema}.events AS e
+JOIN #rekey AS r ON r.old_key = e.company_key;
+
+UPDATE s SET company_key = r.new_key
+FROM {schema}.signals AS s
+JOIN #rekey AS r ON r.old_key = s.company_key;
+
+DELETE sc
+FROM {schema}.scores AS sc
+JOIN #rekey AS r ON r.old_key = sc.company_key;
+
+DELETE c
+FROM {schema}.companies AS c
+JOIN #rekey AS r ON r.old_key = c.company_key
+WHERE EXISTS (SELECT 1 FROM {schema}.companies AS c2 WHERE c2.company_key = r.new_key);
+
+UPDATE c SET company_key = r.new_key
+FROM {schema}.companies AS c
+JOIN #rekey AS r ON r.old_key = c.company_key;
+
+DROP TABLE #rekey;
+""")
+        recompute_scores(cur, schema)
+
+    cur.execute(f"""
+MERGE {schema}.etl_meta AS tgt
+USING (SELECT 'company_key_hash' AS name, ? AS value) AS src
+ON tgt.name = src.name
+WHEN MATCHED THEN
+  UPDATE SET value = src.value, updated_at = SYSUTCDATETIME()
+WHEN NOT MATCHED THEN
+  INSERT (name, value) VALUES (src.name, src.value);
+""", (COMPANY_KEY_HASH,))
+    print(f"[KEYS] company_key -> {COMPANY_KEY_HASH}: {len(pairs)} empresas con clave nueva")
+    return True
 
 # -----------------------------
 # ETL BORME
@@ -271,10 +710,137 @@ WHEN NOT MATCHED THEN
 
 def fetch_borme_sumario(yyyymmdd: str) -> Dict:
     url = BORME_API.format(yyyymmdd=yyyymmdd)
-    r = requests.get(url, headers={"Accept": "application/json"}, timeout=30)
+    r = _SESSION.get(url, headers={"Accept": "application/json"}, timeout=30)
     r.raise_for_status()
     return r.json()
 
+def _native_scan(buf) -> Tuple[str, List[bool], int]:
+    # Por encima de PDF_SPOOL_MAX el PDF ya está en disco: se mapea en vez de leerlo a bytes,
+    # para no perder el ahorro de memoria del streaming. Por debajo, copiarlo está acotado.
+    size = buf.seek(0, os.SEEK_END)
+    buf.seek(0)
+    if size <= PDF_SPOOL_MAX:
+        return _NATIVE.extract_and_classify(buf.read())
+    with mmap.mmap(buf.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _NATIVE.extract_and_classify(mm)
+
+def scan_pdf(url_pdf: str) -> Tuple[str, Dict[str, bool]]:
+    with SpooledTemporaryFile(max_size=PDF_SPOOL_MAX) as buf:
+        download_pdf(url_pdf, buf)
+
+        if _NATIVE is not None:
+            try:
+                excerpt, hits, pages = _native_scan(buf)
+                if pages >= PDF_MAX_PAGES:
+                    print(f"[BORME] AVISO {url_pdf} -> leídas solo {PDF_MAX_PAGES} páginas")
+                return excerpt, {name: hit for (name, _), hit in zip(SIGNAL_CLASSES, hits)}
+            except ValueError as e:
+                # PDF roto para lopdf, página sin extraer o ningún texto: se reintenta en Python
+                print(f"[BORME] AVISO arraigo_pdf falló en {url_pdf}, se usa Python -> {e}")
+                buf.seek(0)
+
+        with closing(_pdf_page_texts(buf)) as pages:
+            return _scan_pages(url_pdf, pages)
+
+def _scan_pages(url_pdf: str, pages: Iterator[str]) -> Tuple[str, Dict[str, bool]]:
+    # Detecta página a página y deja de extraer en cuanto están las tres clases y el extracto
+    sigs = {name: False for name, _ in SIGNAL_CLASSES}
+    excerpt = ""
+    tail = ""
+    for n, page in enumerate(pages, 1):
+        if len(excerpt) < EXCERPT_LEN:
+            excerpt = (excerpt + "\n" + page if n > 1 else page)[:EXCERPT_LEN]
+
+        # La página se escanea tal cual (sin copias); la costura con la anterior,
+        # aparte y acotada, cubre keywords partidas entre páginas
+        found = [detect_signals(page)]
+        if tail:
+            found.append(detect_signals(tail + "\n" + page[:_SEAM_LEN]))
+        for hits in found:
+            for name, hit in hits.items():
+                sigs[name] = sigs[name] or hit
+        tail = page[-_SEAM_LEN:]
+
+        if all(sigs.values()) and len(excerpt) >= EXCERPT_LEN:
+            break
+        if n >= PDF_MAX_PAGES:
+            print(f"[BORME] AVISO {url_pdf} -> leídas solo {PDF_MAX_PAGES} páginas")
+            break
+    return excerpt, sigs
+
+# La caché se invalida si cambian las keywords o el tamaño del extracto
+_CACHE_VERSION = hashlib.sha256(repr((SIGNAL_CLASSES, EXCERPT_LEN)).encode("utf-8")).hexdigest()[:16]
+
+def _cache_path(url_pdf: str) -> str:
+    return os.path.join(BORME_CACHE_DIR, hashlib.sha256(url_pdf.encode("utf-8")).hexdigest() + ".json")
+
+def _remote_validator(url_pdf: str) -> Dict:
+    # ETag / Content-Length vía HEAD: si el PDF cambia en origen, la entrada deja de valer
+    r = _SESSION.head(url_pdf, timeout=30, allow_redirects=True)
+    r.raise_for_status()
+    validator = {"etag": r.headers.get("ETag"), "length": r.headers.get("Content-Length")}
+    return validator if (validator["etag"] or validator["length"]) else {}
+
+def prune_cache(max_age_days: int = BORME_CACHE_MAX_AGE_DAYS):
+    # Las re-ejecuciones tocan fechas recientes: lo antiguo solo ocupa disco
+    if not BORME_CACHE_DIR or not os.path.isdir(BORME_CACHE_DIR):
+        return
+    cutoff = datetime.now(timezone.utc).timestamp() - max_age_days * 86400
+    for entry in os.scandir(BORME_CACHE_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def fetch_and_parse(url_pdf: str) -> Tuple[str, Dict[str, bool]]:
+    # Corre en un hilo del pool: solo red + PDF + caché en disco, nada de SQL.
+    # Se guarda {extracto, señales}, no el texto completo, para acotar el disco.
+    if not BORME_CACHE_DIR:
+        return scan_pdf(url_pdf)
+
+    path = _cache_path(url_pdf)
+    try:
+        validator = _remote_validator(url_pdf)
+    except Exception:
+        validator = {}
+
+    if validator:
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            if entry.get("version") == _CACHE_VERSION and entry.get("validator") == validator:
+                return entry["excerpt"], entry["sigs"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    excerpt, sigs = scan_pdf(url_pdf)
+
+    if validator:
+        tmp = None
+        try:
+            os.makedirs(BORME_CACHE_DIR, exist_ok=True)
+            # Escritura atómica: otro hilo o una ejecución cortada no deja JSON a medias
+            with NamedTemporaryFile("w", encoding="utf-8", dir=BORME_CACHE_DIR, suffix=".tmp", delete=False) as f:
+                tmp = f.name
+                json.dump({"version": _CACHE_VERSION, "validator": validator, "url": url_pdf,
+                           "excerpt": excerpt, "sigs": sigs}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except (OSError, ValueError) as e:
+            # Best-effort (UnicodeEncodeError con surrogates sueltos, p. ej.): el resultado ya
+            # está calculado, y el .tmp no se queda en la caché que guarda actions/cache
+            print(f"[BORME] AVISO caché no escrita {url_pdf} -> {e}")
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+    return excerpt, sigs
+
+def borme_source_ref(it: Dict) -> str:
+    # Sin identificador, la URL del PDF; recortado a events.source_ref (NVARCHAR(256))
+    return (it.get("identificador") or it["url_pdf"])[:256]
+
 def etl_borme(run_date: str, schema: str, cap: int):
     if not run_date:
         run_date = utc_today_yyyymmdd()
@@ -287,80 +853,106 @@ def etl_borme(run_date: str, schema: str, cap: int):
 
     conn = sql_conn()
     cur = conn.cursor()
+    cur.fast_executemany = True
     ensure_schema(cur, schema)
+    if migrate_company_keys(cur, schema):
+        conn.commit()
+    since = sql_now(cur)
+
+    # Dedup antes de descargar: identificadores ya cargados en SQL y repetidos en el sumario
+    event_date = datetime.strptime(run_date, "%Y%m%d").date()
+    seen_refs = recent_source_refs(cur, schema, "BORME", event_date - timedelta(days=BORME_DEDUP_DAYS))
+    todo = []
+    for it in pdf_items:
+        ref = borme_source_ref(it)
+        if ref in seen_refs:
+            continue
+        seen_refs.add(ref)
+        todo.append(it)
+    print(f"[BORME] ya cargados o repetidos={len(pdf_items) - len(todo)} pendientes={len(todo)}")
 
+    # Se acumula todo y se escribe en lote al final
+    companies, events, signals = [], [], []
+    seen_ckeys = set()
     processed = 0
-    for it in pdf_items[:cap]:
-        try:
-            title = it.get("titulo") or ""
-            ident = it.get("identificador") or ""
-            url_pdf = it.get("url_pdf")
-
-            text = pdf_text_from_url(url_pdf)
-            sigs = detect_signals(text)
-
-            # Control de ruido: si no hay señales, saltamos
-            if not (sigs["pos"] or sigs["gov"] or sigs["neg"]):
-                continue
-
-            # MVP: usamos título como proxy de “empresa”
-            company_name = (title[:220] or "Empresa (BORME)").strip()
-            province = ""
-            ccaa = ""
-            ckey = make_company_key(company_name, province, ccaa)
-
-            upsert_company(cur, schema, ckey, company_name, province, ccaa)
-
-            excerpt = (text[:1200] if text else "")
-            ev = {
-                "source": "BORME",
-                "source_ref": ident,
-                "event_date": datetime.strptime(run_date, "%Y%m%d").date(),
-                "event_type": "borme_pdf",
-                "title": title[:500],
-                "url": url_pdf,              # ✅ solo URL
-                "raw_excerpt": excerpt,       # ✅ extracto
-                "company_key": ckey,
-            }
-            event_id = insert_event(cur, schema, ev)
-
-            if sigs["pos"]:
-                insert_signal(cur, schema, {
-                    "company_key": ckey,
-                    "signal_date": ev["event_date"],
-                    "signal_kind": "explicit_or_text_relevo",
-                    "weight": 40,
-                    "source": "BORME",
-                    "event_id": event_id,
-                    "notes": "Keywords positivas (traspaso/cesión/jubilación/relevo)."
-                })
-            if sigs["gov"]:
-                insert_signal(cur, schema, {
-                    "company_key": ckey,
-                    "signal_date": ev["event_date"],
-                    "signal_kind": "junta_o_cambio",
-                    "weight": 15,
-                    "source": "BORME",
-                    "event_id": event_id,
-                    "notes": "Keywords de junta/cambio accionario."
-                })
-            if sigs["neg"]:
-                insert_signal(cur, schema, {
-                    "company_key": ckey,
-                    "signal_date": ev["event_date"],
-                    "signal_kind": "negativa_distressed",
-                    "weight": -50,
-                    "source": "BORME",
-                    "event_id": event_id,
-                    "notes": "Keywords negativas (disolución/concurso/liquidación)."
-                })
+    prune_cache()
+    with ThreadPoolExecutor(max_workers=BORME_WORKERS) as ex:
+        futures = {ex.submit(fetch_and_parse, it["url_pdf"]): it for it in todo[:cap]}
+        # Las escrituras SQL siguen en el hilo principal, con un único cursor
+        for fut in as_completed(futures):
+            it = futures[fut]
+            try:
+                title = it.get("titulo") or ""
+                url_pdf = check_nvarchar(it.get("url_pdf"), 1024, "url")
+
+                excerpt, sigs = fut.result()
+
+                # Control de ruido: si no hay señales, saltamos
+                if not (sigs["pos"] or sigs["gov"] or sigs["neg"]):
+                    continue
+
+                # MVP: usamos título como proxy de “empresa”
+                company_name = (fit_nvarchar(title, 220) or "Empresa (BORME)").strip()
+                province = ""
+                ccaa = ""
+                ckey = make_company_key(company_name, province, ccaa)
 
-            processed += 1
+                if ckey not in seen_ckeys:
+                    seen_ckeys.add(ckey)
+                    companies.append((ckey, company_name, province, ccaa))
 
-        except Exception as e:
-            print(f"[BORME] ERROR ident={it.get('identificador')} -> {e}")
-
-    recompute_scores(cur, schema)
+                ev = {
+                    "source": "BORME",
+                    "source_ref": borme_source_ref(it),  # mismo valor que usa el dedup
+                    "event_date": event_date,
+                    "event_type": "borme_pdf",
+                    "title": fit_nvarchar(title, 500),
+                    "url": url_pdf,              # ✅ solo URL
+                    "raw_excerpt": clean_nvarchar(excerpt),  # ✅ extracto
+                    "company_key": ckey,
+                }
+                event_idx = len(events)
+                events.append(ev)
+
+                if sigs["pos"]:
+                    signals.append({
+                        "company_key": ckey,
+                        "signal_date": ev["event_date"],
+                        "signal_kind": "explicit_or_text_relevo",
+                        "weight": 40,
+                        "source": "BORME",
+                        "event_idx": event_idx,
+                        "notes": "Keywords positivas (traspaso/cesión/jubilación/relevo)."
+                    })
+                if sigs["gov"]:
+                    signals.append({
+                        "company_key": ckey,
+                        "signal_date": ev["event_date"],
+                        "signal_kind": "junta_o_cambio",
+                        "weight": 15,
+                        "source": "BORME",
+                        "event_idx": event_idx,
+                        "notes": "Keywords de junta/cambio accionario."
+                    })
+                if sigs["neg"]:
+                    signals.append({
+                        "company_key": ckey,
+                        "signal_date": ev["event_date"],
+                        "signal_kind": "negativa_distressed",
+                        "weight": -50,
+                        "source": "BORME",
+                        "event_idx": event_idx,
+                        "notes": "Keywords negativas (disolución/concurso/liquidación)."
+                    })
+
+                processed += 1
+
+            except Exception as e:
+                print(f"[BORME] ERROR ident={it.get('identificador')} -> {e}")
+
+    upsert_companies(cur, schema, companies)
+    insert_events(cur, schema, events, signals)
+    recompute_scores(cur, schema, since=since)
     conn.commit()
     conn.close()
     print(f"[BORME] procesados={processed} | scores recalculados")
@@ -372,19 +964,20 @@ def etl_borme(run_date: str, schema: str, cap: int):
 def scrape_listings_basic(url: str, max_items: int = 25) -> List[Dict]:
     if BeautifulSoup is None:
         raise RuntimeError("beautifulsoup4 no disponible.")
-    r = requests.get(url, timeout=30, headers={"User-Agent": "arraigo-etl/1.0"})
+    r = _SESSION.get(url, timeout=30, headers={"User-Agent": "arraigo-etl/1.0"})
     r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+    soup = BeautifulSoup(r.text, HTML_PARSER)
 
     links = []
     for a in soup.select("a[href]"):
-        txt = (a.get_text(" ", strip=True) or "").lower()
+        txt = a.get_text(" ", strip=True) or ""
+        if not _LINK_RE.search(txt):
+            continue
         href = a.get("href") or ""
-        if any(k in txt for k in ["oferta", "oportunidad", "negocio", "traspaso", "relevo", "comprar", "vender"]):
-            if href.startswith("/"):
-                href = url.rstrip("/") + href
-            if href.startswith("http"):
-                links.append({"title": a.get_text(" ", strip=True)[:300], "url": href})
+        if href.startswith("/"):
+            href = url.rstrip("/") + href
+        if href.startswith("http"):
+            links.append({"title": txt[:300], "url": href})
 
     seen = set()
     out = []
@@ -400,57 +993,88 @@ def scrape_listings_basic(url: str, max_items: int = 25) -> List[Dict]:
 def etl_regional(schema: str):
     today = datetime.now(timezone.utc).date()
 
-    conn = sql_conn()
-    cur = conn.cursor()
-    ensure_schema(cur, schema)
+    # Las fuentes son independientes: se scrapean a la vez mientras se abre la conexión SQL
+    with ThreadPoolExecutor(max_workers=len(REGIONAL_SOURCES)) as ex:
+        futures = [ex.submit(scrape_listings_basic, src["list_url"], 25) for src in REGIONAL_SOURCES]
 
+        conn = sql_conn()
+        cur = conn.cursor()
+        cur.fast_executemany = True
+        ensure_schema(cur, schema)
+        if migrate_company_keys(cur, schema):
+            conn.commit()
+        since = sql_now(cur)
+
+    companies, events, signals = [], [], []
     inserted = 0
-    for src in REGIONAL_SOURCES:
+    for src, fut in zip(REGIONAL_SOURCES, futures):
         source = src["source"]
         ccaa = src["ccaa"]
-        list_url = src["list_url"]
 
         try:
-            listings = scrape_listings_basic(list_url, max_items=25)
+            listings = fut.result()
             print(f"[REG] source={source} ccaa={ccaa} listings={len(listings)}")
 
             for li in listings:
-                name = li["title"] or "Negocio en traspaso"
-                province = ""
-                ckey = make_company_key(name, province, ccaa)
-                upsert_company(cur, schema, ckey, name, province, ccaa)
-
-                ev = {
-                    "source": source,
-                    "source_ref": None,
-                    "event_date": today,
-                    "event_type": "listing",
-                    "title": name[:500],
-                    "url": li["url"],  # ✅ solo URL
-                    "raw_excerpt": f"Listing detectado (heurístico) en {source} ({ccaa}).",
-                    "company_key": ckey
-                }
-                event_id = insert_event(cur, schema, ev)
-
-                insert_signal(cur, schema, {
-                    "company_key": ckey,
-                    "signal_date": today,
-                    "signal_kind": "explicit_listing",
-                    "weight": 40,
-                    "source": source,
-                    "event_id": event_id,
-                    "notes": "Señal explícita: listing/bolsa (heurístico)."
-                })
-                inserted += 1
+                # Un listing malo (p. ej. href enorme) se salta solo, sin tumbar el lote SQL
+                try:
+                    url = check_nvarchar(li["url"], 1024, "url")
+                    name = fit_nvarchar(li["title"] or "Negocio en traspaso", 512)
+                    province = ""
+                    ckey = make_company_key(name, province, ccaa)
+                    companies.append((ckey, name, province, ccaa))
+
+                    ev = {
+                        "source": source,
+                        "source_ref": None,
+                        "event_date": today,
+                        "event_type": "listing",
+                        "title": fit_nvarchar(name, 500),
+                        "url": url,  # ✅ solo URL
+                        "raw_excerpt": f"Listing detectado (heurístico) en {source} ({ccaa}).",
+                        "company_key": ckey
+                    }
+                    event_idx = len(events)
+                    events.append(ev)
+
+                    signals.append({
+                        "company_key": ckey,
+                        "signal_date": today,
+                        "signal_kind": "explicit_listing",
+                        "weight": 40,
+                        "source": source,
+                        "event_idx": event_idx,
+                        "notes": "Señal explícita: listing/bolsa (heurístico)."
+                    })
+                    inserted += 1
+                except Exception as e:
+                    print(f"[REG] ERROR source={source} url={li.get('url')} -> {e}")
 
         except Exception as e:
             print(f"[REG] ERROR source={source} -> {e}")
 
-    recompute_scores(cur, schema)
+    upsert_companies(cur, schema, companies)
+    insert_events(cur, schema, events, signals)
+    recompute_scores(cur, schema, since=since)
     conn.commit()
     conn.close()
     print(f"[REG] insertados={inserted} | scores recalculados")
 
+# -----------------------------
+# Scores
+# -----------------------------
+
+def rescore_all(schema: str):
+    conn = sql_conn()
+    cur = conn.cursor()
+    cur.fast_executemany = True
+    ensure_schema(cur, schema)
+    migrate_company_keys(cur, schema)
+    recompute_scores(cur, schema)
+    conn.commit()
+    conn.close()
+    print("[SCORES] recalculados (completo)")
+
 # -----------------------------
 # Main
 # -----------------------------
@@ -464,6 +1088,7 @@ def main():
     p1.add_argument("--cap", type=int, default=50, help="Máximo PDFs por ejecución (default 50)")
 
     sub.add_parser("regional", help="Ingesta regional (2–3 veces/semana)")
+    sub.add_parser("scores", help="Recalcula todos los scores (p. ej. tras cambiar score_version)")
 
     args = parser.parse_args()
     schema = os.environ.get("AZURE_SQL_SCHEMA", "dbo")
@@ -477,5 +1102,8 @@ def main():
     elif args.cmd == "regional":
         etl_regional(schema)
 
+    elif args.cmd == "scores":
+        rescore_all(schema)
+
 if __name__ == "__main__":
     main()